@@ -1,8 +1,11 @@
 import argparse
 import logging
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
+import msgspec
+import numpy as np
 from pyproj import Transformer
 import trimesh
 import zipfile
@@ -12,10 +15,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# light gray RGBA, textures not preserved
+FACE_COLOR = np.array([180, 180, 180, 255], dtype=np.uint8)
+
+# bytes handed to the zip compressor per write when streaming the DAE
+KMZ_WRITE_CHUNK = 1 << 20
+
 
 # todo: more precise types: literals, ranges
-@dataclass
-class CoordinateMap:
+class CoordinateMap(msgspec.Struct):
     epsg: int  # epsg code
     crs: str  # parsed line from file
     easting: float
@@ -24,8 +32,8 @@ class CoordinateMap:
 
 @dataclass(frozen=True)
 class GPSCoordinate:
-    long: float
-    lat: float
+    long: float | np.ndarray
+    lat: float | np.ndarray
 
 
 def parse_coordinates(path: str) -> CoordinateMap:
@@ -37,7 +45,10 @@ def parse_coordinates(path: str) -> CoordinateMap:
     '''
     """
     with open(path, "r") as data:
-        crs, coordinates = [line.strip() for line in data.readlines()[:2]]
+        try:
+            crs, coordinates = next(data).strip(), next(data).strip()
+        except StopIteration:
+            raise ValueError(f"Expected CRS and coordinates lines in {path}") from None
         # naïve parsing for northing zone
         zone = crs.split()[-1]
         easting_index, hemisphere = (
@@ -53,49 +64,62 @@ def parse_coordinates(path: str) -> CoordinateMap:
         )
 
 
-def utm_to_long_lat(epsg_code: int, easting: float, northing: float) -> GPSCoordinate:
-    transformer = Transformer.from_crs(f"EPSG:{epsg_code}", "EPSG:4326", always_xy=True)
+# same operation PROJ picks for EPSG:326xx/327xx -> EPSG:4326 in x/y order,
+# given explicitly to skip the CRS database lookup and operation search
+UTM_TO_WGS84_PIPELINE = (
+    "+proj=pipeline +step +inv +proj=utm +zone={zone}{south} +ellps=WGS84 "
+    "+step +proj=unitconvert +xy_in=rad +xy_out=deg"
+)
+
+
+@lru_cache(maxsize=None)
+def _get_transformer(zone: int, south: bool) -> Transformer:
+    """Build (once per UTM zone) a transformer from UTM to WGS84."""
+    return Transformer.from_pipeline(
+        UTM_TO_WGS84_PIPELINE.format(zone=zone, south=" +south" if south else "")
+    )
+
+
+def utm_to_long_lat(
+    epsg_code: int,
+    easting: float | np.ndarray,
+    northing: float | np.ndarray,
+) -> GPSCoordinate:
+    """
+    Convert UTM easting/northing to WGS84 longitude/latitude.
+
+    Scalars give scalar coordinates; arrays are transformed in a single
+    call, so many points pay one Python round trip instead of one each:
+    '''
+    gps = utm_to_long_lat(epsg, df["E"].values, df["N"].values)
+    '''
+    """
+    hemisphere_code, zone = divmod(epsg_code, 100)
+    if hemisphere_code not in (326, 327) or not 1 <= zone <= 60:
+        raise ValueError(f"Not a WGS84 UTM EPSG code: {epsg_code}")
+    transformer = _get_transformer(zone, south=hemisphere_code == 327)
     return GPSCoordinate(*transformer.transform(easting, northing))
 
 
 def get_dae_bytes_from_obj(obj_path: str, should_center: bool = True) -> bytes:
-    mesh = trimesh.load(Path(obj_path).resolve(), force="mesh")
+    # process=False: skip vertex merging, the mesh is only recentered and
+    # repainted before export
+    mesh = trimesh.load(obj_path, file_type="obj", force="mesh", process=False)
     if should_center:
-        centroid = mesh.centroid.copy()
-        centroid[2] = 0  # do not move Z
-        mesh.vertices -= centroid
-    mesh.visual = trimesh.visual.ColorVisuals(
-        mesh,
-        face_colors=[180, 180, 180, 255],  # light gray, textures not preserved
-    )
+        # plain vertex mean: a single linear pass, unlike the area-weighted
+        # mesh.centroid; mutate the tracked array in place so trimesh
+        # invalidates its caches
+        vertices = mesh.vertices
+        vertices[:, :2] -= vertices[:, :2].mean(axis=0)  # do not move Z
+    # read-only (n_faces, 4) view, trimesh copies it into its own array
+    face_colors = np.broadcast_to(FACE_COLOR, (len(mesh.faces), 4))
+    mesh.visual = trimesh.visual.ColorVisuals(mesh, face_colors=face_colors)
     dae_bytes = trimesh.exchange.dae.export_collada(mesh)
     return dae_bytes.replace(b"<up_axis>Y_UP</up_axis>", b"<up_axis>Z_UP</up_axis>")
 
 
-def create_kml(
-    lat: float,
-    lon: float,
-    model_path: str = "models/model.dae",
-    altitude: float = 0.0,
-    heading: float = 0.0,
-    tilt: float = 0.0,
-    roll: float = 0.0,
-    scale: float = 1.0,
-) -> str:
-    """
-    Create KML document with georeferenced 3D model.
-
-    Args:
-        lat: Latitude in decimal degrees
-        lon: Longitude in decimal degrees
-        model_path: Relative path to DAE file inside KMZ
-        altitude: Height above ground in meters
-        heading: Rotation around Z-axis (0=North, 90=East)
-        tilt: Rotation around X-axis
-        roll: Rotation around Y-axis
-        scale: Uniform scale factor
-    """
-    return f"""<?xml version="1.0" encoding="UTF-8"?>
+# fixed precision: coordinates to 1e-7 degrees (~1 cm), altitude and angles to 1e-3
+KML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
 <kml xmlns="http://www.opengis.net/kml/2.2">
   <Document>
     <name>3D Model</name>
@@ -104,14 +128,14 @@ def create_kml(
       <Model id="model">
         <altitudeMode>relativeToGround</altitudeMode>
         <Location>
-          <longitude>{lon}</longitude>
-          <latitude>{lat}</latitude>
-          <altitude>{altitude}</altitude>
+          <longitude>{lon:.7f}</longitude>
+          <latitude>{lat:.7f}</latitude>
+          <altitude>{altitude:.3f}</altitude>
         </Location>
         <Orientation>
-          <heading>{heading}</heading>
-          <tilt>{tilt}</tilt>
-          <roll>{roll}</roll>
+          <heading>{heading:.3f}</heading>
+          <tilt>{tilt:.3f}</tilt>
+          <roll>{roll:.3f}</roll>
         </Orientation>
         <Scale>
           <x>{scale}</x>
@@ -127,16 +151,70 @@ def create_kml(
 </kml>"""
 
 
+def create_kml(
+    lat: float,
+    lon: float,
+    model_path: str = "models/model.dae",
+    altitude: float = 0.0,
+    heading: float = 0.0,
+    tilt: float = 0.0,
+    roll: float = 0.0,
+    scale: float = 1.0,
+) -> str:
+    """
+    Create KML document with georeferenced 3D model.
+
+    Args:
+        lat: Latitude in decimal degrees
+        lon: Longitude in decimal degrees
+        model_path: Relative path to DAE file inside KMZ
+        altitude: Height above ground in meters
+        heading: Rotation around Z-axis (0=North, 90=East)
+        tilt: Rotation around X-axis
+        roll: Rotation around Y-axis
+        scale: Uniform scale factor
+    """
+    return KML_TEMPLATE.format(
+        lat=lat,
+        lon=lon,
+        model_path=model_path,
+        altitude=altitude,
+        heading=heading,
+        tilt=tilt,
+        roll=roll,
+        scale=scale,
+    )
+
+
 def write_kmz(
     kml: str,
     dae_bytes: bytes,
     kmz_name: str = "output.kmz",
     kml_name: str = "doc.kml",
     models_path: str = "models/model.dae",
+    compression: int = zipfile.ZIP_DEFLATED,
+    compresslevel: int | None = 1,
 ) -> None:
-    with zipfile.ZipFile(kmz_name, "w", zipfile.ZIP_DEFLATED) as kmz:
+    """
+    Package KML and DAE into a KMZ archive.
+
+    Deflate at level 1 is several times faster than the default level 6 on
+    MB-sized DAEs for a slightly larger file. zipfile.ZIP_LZMA compresses
+    better, but many KMZ viewers only read deflate.
+
+    The DAE is streamed into the archive in chunks, so no compressed copy
+    of the whole model is held in memory.
+    """
+    with zipfile.ZipFile(
+        kmz_name, "w", compression=compression, compresslevel=compresslevel
+    ) as kmz:
         kmz.writestr(kml_name, kml)
-        kmz.writestr(models_path, dae_bytes)
+        dae_view = memoryview(dae_bytes)
+        # zipfile's own rule for known sizes, Zip64 only where it is needed
+        force_zip64 = len(dae_bytes) * 1.05 > zipfile.ZIP64_LIMIT
+        with kmz.open(models_path, "w", force_zip64=force_zip64) as dae_file:
+            for offset in range(0, len(dae_view), KMZ_WRITE_CHUNK):
+                dae_file.write(dae_view[offset : offset + KMZ_WRITE_CHUNK])
 
 
 def convert_obj_to_kmz(obj_path: str, geo_path: str, output_path: str) -> None:
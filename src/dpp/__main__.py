@@ -11,26 +11,59 @@ Steps:
 """
 
 import math
-from dataclasses import dataclass
-from typing import Iterator
+from functools import lru_cache
+from typing import Any, Iterator, NamedTuple
 import cv2
 from pprint import pprint
 
 import numpy as np
+from numba import njit
 
 VIDEO_PATH = "/Users/agerasymchuk/private_repo/cv_nav/data/video1.MP4"
 
+# PyPI OpenCV wheels are built without CUDA, those fall back to CPU
+USE_CUDA = cv2.cuda.getCudaEnabledDeviceCount() > 0
 
-@dataclass(frozen=True)
-class Frame:
-    frame: np.ndarray
+# np.ndarray on CPU, cv2.cuda.GpuMat when USE_CUDA
+Image = Any
+
+
+def to_device(frame: np.ndarray) -> Image:
+    """Upload frame to GPU when CUDA is available, otherwise return it as is."""
+    if not USE_CUDA:
+        return frame
+    frame_gpu = cv2.cuda.GpuMat()
+    frame_gpu.upload(frame)
+    return frame_gpu
+
+
+def to_host(frame: Image) -> np.ndarray:
+    """Download frame for CPU-only APIs (drawing, display)."""
+    return frame.download() if USE_CUDA else frame
+
+
+def _allocate_frame(height: int, width: int) -> Image:
+    if USE_CUDA:
+        return cv2.cuda.GpuMat(height, width, cv2.CV_8UC1)
+    return np.empty((height, width), dtype=np.uint8)
+
+
+def frame_size(frame: Image) -> tuple[int, int]:
+    """(width, height) of either a host or a device frame."""
+    if USE_CUDA:
+        return frame.size()
+    height, width = frame.shape[:2]
+    return width, height
+
+
+class Frame(NamedTuple):
+    frame: Image
     index: int
 
 
 def create_frame_reader(
-    path: str, resize_coef: float = 0.5, stop: int | None = None
+    path: str, resize_coef: float = 0.5, stop: int | None = None, step: int = 10
 ) -> Iterator[Frame]:
-    step = 10
     cap = cv2.VideoCapture(path)
     if not cap.isOpened():
         print(f"could not open path: {path}")
@@ -38,36 +71,154 @@ def create_frame_reader(
 
     frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
 
+    # output frames alternate between two reused buffers: the frame yielded
+    # previously stays intact while the next one is written, so consumers
+    # may keep one previous frame but must copy to keep more
+    buffers: list[Image] = []
+
     current_frame = 0
     try:
         while current_frame < frame_count:
             if stop is not None and current_frame >= stop:
                 break
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame)
+            if current_frame > 0:
+                # read sequentially: seeking re-decodes from the last keyframe,
+                # grab() just advances without converting the skipped frames
+                for _ in range(step - 1):
+                    cap.grab()
+
             success, frame = cap.read()
             if not success:
                 print(f"unable to open frame position: {current_frame}")
                 current_frame += step
                 continue
 
-            # paint gray
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # resize
             new_height, new_width = (
-                int(resize_coef * dim_size) for dim_size in gray.shape
+                int(resize_coef * dim_size) for dim_size in frame.shape[:2]
             )
-            gray_resized = cv2.resize(gray, (new_width, new_height))
-            print(f"new shape: {gray_resized.shape}")
+            # (re)allocate when the size changes, resize() ignores a
+            # mismatched dst and would leave stale pixels in it
+            if not buffers or frame_size(buffers[0]) != (new_width, new_height):
+                buffers = [_allocate_frame(new_height, new_width) for _ in range(2)]
+            gray_resized, spare = buffers
+            buffers = [spare, gray_resized]
+
+            if USE_CUDA:
+                # upload once, paint gray and resize on the device, the result
+                # stays there for tracking
+                gray = cv2.cuda.cvtColor(to_device(frame), cv2.COLOR_BGR2GRAY)
+                cv2.cuda.resize(gray, (new_width, new_height), dst=gray_resized)
+            else:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                cv2.resize(gray, (new_width, new_height), dst=gray_resized)
+            print(f"new size: {frame_size(gray_resized)}")
 
             print(f"current position: {current_frame}")
-            yield Frame(frame=gray_resized, index=current_frame)
+            yield Frame(gray_resized, current_frame)
             current_frame += step
     finally:
         cap.release()
 
 
+@lru_cache(maxsize=None)
+def _cuda_corner_detector(
+    maxCorners: int, qualityLevel: float, minDistance: float, blockSize: int
+):
+    return cv2.cuda.createGoodFeaturesToTrackDetector(
+        cv2.CV_8UC1, maxCorners, qualityLevel, minDistance, blockSize
+    )
+
+
+@lru_cache(maxsize=None)
+def _cuda_lk_tracker(winSize: tuple[int, int], maxLevel: int, criteria: tuple):
+    _, max_iterations, _ = criteria
+    return cv2.cuda.SparsePyrLKOpticalFlow.create(
+        winSize=winSize, maxLevel=maxLevel, iters=max_iterations
+    )
+
+
+def detect_features(frame: Image, feature_params: dict) -> np.ndarray:
+    """ShiTomasi corners of frame, shaped (N, 1, 2) like cv2.goodFeaturesToTrack."""
+    if not USE_CUDA:
+        return cv2.goodFeaturesToTrack(frame, mask=None, **feature_params)
+    corners = _cuda_corner_detector(**feature_params).detect(frame)
+    return corners.download().reshape(-1, 1, 2)
+
+
+def track_features(
+    frame1: Image, frame2: Image, points1: np.ndarray, lk_params: dict
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Track points1 from frame1 to frame2 with pyramidal Lucas-Kanade.
+    Returns (points2, status) shaped as cv2.calcOpticalFlowPyrLK does.
+    """
+    if not USE_CUDA:
+        points2, status, _ = cv2.calcOpticalFlowPyrLK(
+            frame1, frame2, points1, nextPts=None, **lk_params
+        )
+        return points2, status
+
+    points1_gpu = cv2.cuda.GpuMat()
+    points1_gpu.upload(points1.reshape(1, -1, 2))
+    points2_gpu, status_gpu, _ = _cuda_lk_tracker(**lk_params).calc(
+        frame1, frame2, points1_gpu, None
+    )
+    return (
+        points2_gpu.download().reshape(-1, 1, 2),
+        status_gpu.download().reshape(-1, 1),
+    )
+
+
+@lru_cache(maxsize=None)
+def _cuda_dense_flow(width: int, height: int):
+    try:
+        # fixed-function optical flow hardware, Turing GPUs and newer
+        return cv2.cuda.NvidiaOpticalFlow_2_0.create((width, height))
+    except (AttributeError, cv2.error):
+        return cv2.cuda.FarnebackOpticalFlow.create(
+            numLevels=5, winSize=13, numIters=10, polyN=5, polySigma=1.1
+        )
+
+
+def dense_flow(frame1: Image, frame2: Image) -> np.ndarray:
+    """
+    Per-pixel flow from frame1 to frame2 as a (height, width, 2) float32 array,
+    GPU only: NVIDIA hardware flow, CUDA Farneback where it is unavailable.
+    """
+    estimator = _cuda_dense_flow(*frame_size(frame1))
+    if hasattr(estimator, "convertToFloat"):  # NvidiaOpticalFlow_2_0
+        flow, _ = estimator.calc(frame1, frame2, None)
+        flow = estimator.convertToFloat(flow, None)
+    else:
+        flow = estimator.calc(frame1, frame2, None)
+    return flow.download()
+
+
+def dense_flow_correspondences(
+    frame1: Image, frame2: Image, grid_step: int = 16
+) -> tuple[np.ndarray, np.ndarray]:
+    """Point pairs sampled on a regular grid over the dense flow (GPU only)."""
+    flow = dense_flow(frame1, frame2)
+
+    height, width = flow.shape[:2]
+    ys, xs = np.mgrid[
+        grid_step // 2 : height : grid_step, grid_step // 2 : width : grid_step
+    ]
+    ys, xs = ys.ravel(), xs.ravel()
+    points1 = np.stack((xs, ys), axis=-1).astype(np.float32)
+    points2 = points1 + flow[ys, xs]
+
+    # drop points that left the frame
+    inside = (
+        (points2[:, 0] >= 0)
+        & (points2[:, 0] < width)
+        & (points2[:, 1] >= 0)
+        & (points2[:, 1] < height)
+    )
+    return points1[inside], points2[inside]
+
+
 def naïve_lk_optical_flow():
     frame_iterator = create_frame_reader(VIDEO_PATH, stop=None)
     # params for ShiTomasi corner detection
@@ -82,15 +233,12 @@ def naïve_lk_optical_flow():
     )
 
     first_frame = next(frame_iterator).frame
-    mask = np.zeros_like(first_frame)
+    mask = np.zeros_like(to_host(first_frame))
 
-    p0 = cv2.goodFeaturesToTrack(first_frame, mask=None, **feature_params)
+    p0 = detect_features(first_frame, feature_params)
 
-    for f in frame_iterator:
-        frame = f.frame
-        p1, st, err = cv2.calcOpticalFlowPyrLK(
-            first_frame, frame, p0, None, **lk_params
-        )
+    for next_frame, index in frame_iterator:
+        p1, st = track_features(first_frame, next_frame, p0, lk_params)
         if p1 is not None:
             good_new = p1[st == 1]
             good_old = p0[st == 1]
@@ -99,6 +247,7 @@ def naïve_lk_optical_flow():
             continue
 
         # draw the tracks
+        frame = to_host(next_frame).copy()
         for i, (new, old) in enumerate(zip(good_new, good_old)):
             a, b = new.ravel()
             c, d = old.ravel()
@@ -113,10 +262,10 @@ def naïve_lk_optical_flow():
         if k == 27:
             break
 
-        first_frame = frame.copy()
+        first_frame = next_frame
         p0 = good_new.reshape(-1, 1, 2)
 
-        print(f"frame: {f.frame.shape}, index: {f.index}")
+        print(f"frame: {frame_size(next_frame)}, index: {index}")
 
     cv2.destroyAllWindows()
 
@@ -144,24 +293,41 @@ def calculate_intrinsic_matrix(
     )
 
 
+@njit(cache=True, fastmath=True)
+def update_pose(
+    rotation: np.ndarray,
+    position: np.ndarray,
+    relative_rotation: np.ndarray,
+    relative_translation: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Chain a relative (R, t) from recoverPose onto the world pose."""
+    new_rotation = rotation @ relative_rotation
+    new_position = position + new_rotation @ relative_translation.ravel()
+    return new_rotation, new_position
+
+
 def estimate_motion(
-    frame1: np.ndarray,
-    frame2: np.ndarray,
+    frame1: Image,
+    frame2: Image,
     K: np.ndarray,
     feature_params: dict,
     lk_params: dict,
+    grid_step: int = 16,
 ):
-    # 1. detect points to track on the frame 1
-    points1 = cv2.goodFeaturesToTrack(frame1, mask=None, **feature_params)
-    # 2. track
-    points2, status, _ = cv2.calcOpticalFlowPyrLK(
-        frame1, frame2, points1, nextPts=None, **lk_params
-    )
-
-    # 3. filter
-    status = status.ravel()
-    good1 = points1[status == 1]
-    good2 = points2[status == 1]
+    if USE_CUDA:
+        # 1-3. dense flow sampled on a grid, far more points than corners
+        good1, good2 = dense_flow_correspondences(frame1, frame2, grid_step)
+    else:
+        # dense flow is too slow on CPU, track corners instead
+        # 1. detect points to track on the frame 1
+        points1 = detect_features(frame1, feature_params)
+        # 2. track
+        points2, status = track_features(frame1, frame2, points1, lk_params)
+
+        # 3. filter
+        status = status.ravel()
+        good1 = points1[status == 1]
+        good2 = points2[status == 1]
 
     # 4. Geometry
     E, mask = cv2.findEssentialMat(good1, good2, K)
@@ -169,14 +335,18 @@ def estimate_motion(
     return R, t
 
 
-def main():
-    frame_iterator = create_frame_reader(VIDEO_PATH, stop=100)
+def main() -> np.ndarray:
+    step, stop = 10, 100
+    frame_iterator = create_frame_reader(VIDEO_PATH, stop=stop, step=step)
     # params for ShiTomasi corner detection
     feature_params = dict(maxCorners=100, qualityLevel=0.3, minDistance=7, blockSize=7)
 
-    current_position = np.zeros(3, dtype=np.float32)
+    current_position = np.zeros(3)  # float64 like R, t: one update_pose specialization
     current_rotation = np.eye(3)
-    drone_path = [current_position.copy()]
+    # at most one pose per sampled frame, the path is filled in place
+    drone_path = np.empty((stop // step + 1, 3), dtype=np.float32)
+    drone_path[0] = current_position
+    path_length = 1
 
     # Parameters for lucas kanade optical flow
     lk_params = dict(
@@ -186,30 +356,30 @@ def main():
     )
 
     first_frame = next(frame_iterator).frame
-    intrinsic_camera_matrix = calculate_intrinsic_matrix(
-        first_frame.shape[1], first_frame.shape[0]
-    )
+    intrinsic_camera_matrix = calculate_intrinsic_matrix(*frame_size(first_frame))
 
-    for f in frame_iterator:
-        frame = f.frame
+    for frame, index in frame_iterator:
         R, t = estimate_motion(
             first_frame, frame, intrinsic_camera_matrix, feature_params, lk_params
         )
-        print(f"index: {f.index}")
+        print(f"index: {index}")
         print("R")
         pprint(R)
         print("t")
         pprint(t)
 
-        current_rotation = current_rotation @ R
-        current_position = current_position + current_rotation @ t.flatten()
-        drone_path.append(current_position.copy())
+        current_rotation, current_position = update_pose(
+            current_rotation, current_position, R, t
+        )
+        drone_path[path_length] = current_position
+        path_length += 1
 
         first_frame = frame
 
-        print(f"frame: {f.frame.shape}, index: {f.index}")
+        print(f"frame: {frame_size(frame)}, index: {index}")
 
     cv2.destroyAllWindows()
+    return drone_path[:path_length]
 
 
 if __name__ == "__main__":
@@ -1,17 +1,17 @@
 """Signal-cli HTTP daemon client for receiving messages via JSON-RPC."""
 
 import asyncio
-import json
 import logging
 import uuid
 from configparser import ConfigParser
 from contextlib import asynccontextmanager
-from dataclasses import dataclass, field
 from enum import Enum
-from functools import partial
+from functools import cached_property, partial
 from pathlib import Path
 from typing import Any, Awaitable, Callable
 
+import msgspec
+import orjson
 import pytak
 
 logger = logging.getLogger(__name__)
@@ -20,6 +20,14 @@ CONFIG_DIR = Path(__file__).parent
 LOCAL_CONFIG_PATH = CONFIG_DIR / "local_config.ini"
 DEFAULT_CONFIG_PATH = CONFIG_DIR / "config.ini"
 
+# max size of a single JSON-RPC line, envelopes with attachments can be large
+STREAM_LIMIT = 1 << 20
+
+# envelope key handle_socket_message filters on by default, also used to
+# skip other notifications before parsing
+DATA_MESSAGE_KEY = "dataMessage"
+DATA_MESSAGE_MARKER = f'"{DATA_MESSAGE_KEY}"'.encode()
+
 
 def load_config() -> ConfigParser:
     """Load configuration from INI file.
@@ -57,15 +65,16 @@ COT_TYPE_MAP: dict[str, str] = {
 }
 
 
-@dataclass(frozen=True)
-class CoordinateMessage:
+# dict=True is required by cached_property
+class CoordinateMessage(msgspec.Struct, frozen=True, dict=True):
     lat: float
     lon: float
     description: str
     affiliation: Affiliation = Affiliation.UNKNOWN
-    event_id: str = field(default_factory=lambda: f"Signal-Bot-{uuid.uuid4()}")
+    event_id: str = msgspec.field(default_factory=lambda: f"Signal-Bot-{uuid.uuid4()}")
 
     def __post_init__(self) -> None:
+        # msgspec runs this on direct construction as well as on convert/decode
         # Validate latitude
         if not -90 <= self.lat <= 90:
             raise ValueError(f"Invalid latitude: {self.lat}")
@@ -91,12 +100,10 @@ class CoordinateMessage:
 
         return cls(lat=lat, lon=lon, description=parts[2])
 
-    @property
+    @cached_property
     def cot_type(self) -> str:
-        """Generate CoT type string like 'a-h-G-U-C-F-M'."""
-        base = COT_TYPE_MAP.get(self.description.lower())
-        if not base:
-            base = "G-U"
+        """Generate CoT type string like 'a-h-G-U-C-F-M', computed once per message."""
+        base = COT_TYPE_MAP.get(self.description.lower(), "G-U")
         return f"a-{self.affiliation.value}-{base}"
 
     def gen_cot(
@@ -146,28 +153,42 @@ async def receive_from_tcp_socket(
 
     while True:
         try:
-            reader, writer = await asyncio.open_connection(host, port)
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=STREAM_LIMIT
+            )
             logger.info(f"Connected to {host}:{port}")
+            debug = logger.isEnabledFor(logging.DEBUG)
             try:
                 while True:
-                    line = await reader.readline()
-                    if not line:
-                        logger.warning("Connection closed by server")
-                        break
-
-                    line_str = line.decode("utf-8").strip()
-                    if not line_str:
+                    try:
+                        line = await reader.readuntil(b"\n")
+                    except asyncio.IncompleteReadError as e:
+                        if not e.partial.strip():
+                            logger.warning("Connection closed by server")
+                            break
+                        # last line before EOF without a trailing newline, the
+                        # next read ends the loop
+                        line = e.partial
+
+                    if not line.strip():
                         continue
 
-                    logger.debug(f"Raw: {line_str}")
+                    if debug:
+                        logger.debug(f"Raw: {line!r}")
+
+                    # skip typing, receipt and sync notifications before parsing
+                    if DATA_MESSAGE_MARKER not in line and b'"method"' in line:
+                        continue
 
                     try:
-                        message = json.loads(line_str)
+                        # orjson parses the raw bytes, no intermediate str
+                        message = orjson.loads(line)
                         await handle_socket_message(
                             message, message_hanlder=message_handler
                         )
-                    except json.JSONDecodeError:
-                        logger.debug(f"Non-JSON: {line_str}")
+                    except orjson.JSONDecodeError:
+                        if debug:
+                            logger.debug(f"Non-JSON: {line!r}")
 
             finally:
                 writer.close()
@@ -184,7 +205,7 @@ async def receive_from_tcp_socket(
 async def handle_socket_message(
     message: dict[str, Any],
     message_hanlder: MessageHandlerType | None = None,
-    filter_param: str = "dataMessage",
+    filter_param: str = DATA_MESSAGE_KEY,
 ) -> None:
     """
     Generic message handler, can be configured for concrete strategy via callback message_hanlder
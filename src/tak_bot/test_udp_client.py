@@ -8,8 +8,17 @@ cot = """<?xml version=\"1.0\" encoding=\"UTF-8\"?>
 <event version=\"2.0\" type=\"a-h-G-U-C-F\" uid=\"test-marker\" how=\"h-g-i-g-o\" time=\"2025-12-19T21:30:00Z\" start=\"2025-12-19T21:30:00Z\" stale=\"2025-12-19T21:35:00Z\">
   <point lat=\"48.567123\" lon=\"39.87897\" hae=\"0\" ce=\"50\" le=\"50\" />
 </event>"""
+COT_BYTES = cot.encode()
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.sendto(cot.encode(), (UDP_IP, UDP_PORT))
-print(f"Sent CoT to {UDP_IP}:{UDP_PORT}")
-sock.close()
+
+def send(n: int = 1) -> None:
+    """Send the CoT event n times over a single socket."""
+    addr = (UDP_IP, UDP_PORT)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _ in range(n):
+            sock.sendto(COT_BYTES, addr)
+    print(f"Sent {n} CoT to {UDP_IP}:{UDP_PORT}")
+
+
+if __name__ == "__main__":
+    send()